@@ -2,7 +2,8 @@ import pandas as pd
 import streamlit as st
 
 from utils import (
-    load_data, enrich_reviews, compute_station_metrics, compute_overall_summary, top_themes_from
+    load_data, enrich_reviews, compute_station_metrics, compute_overall_summary, top_themes_from,
+    compute_station_comparison,
 )
 
 st.set_page_config(page_title="Shell London Reviews", layout="wide")
@@ -84,20 +85,7 @@ st.write("### Stations improving vs deteriorating")
 stations_cur = compute_station_metrics(stations, reviews_window)
 stations_prev = compute_station_metrics(stations, reviews_prior)
 
-compare = stations_cur[["station_id", "name", "avg_rating", "neg_pct", "review_count"]].merge(
-    stations_prev[["station_id", "avg_rating", "neg_pct", "review_count"]],
-    on="station_id",
-    how="left",
-    suffixes=("_cur", "_prev"),
-)
-
-compare["avg_rating_prev"] = compare["avg_rating_prev"].fillna(0.0)
-compare["neg_pct_prev"] = compare["neg_pct_prev"].fillna(0.0)
-
-compare["delta_rating"] = compare["avg_rating_cur"] - compare["avg_rating_prev"]
-compare["delta_neg_pct"] = compare["neg_pct_cur"] - compare["neg_pct_prev"]
-
-compare = compare[compare["review_count_cur"] > 0].copy()
+compare = compute_station_comparison(stations_cur, stations_prev)
 
 best = compare.sort_values("delta_rating", ascending=False).head(5)
 worst = compare.sort_values("delta_rating", ascending=True).head(5)
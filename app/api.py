@@ -0,0 +1,442 @@
+"""
+Headless metrics API for the Shell London Reviews dashboard.
+
+Serves the same numbers as the Streamlit pages as JSON (default) or Arrow IPC
+(`?format=arrow` or `Accept: application/vnd.apache.arrow.stream`), without
+running the UI. Run from the repo root:
+
+    python app/api.py --port 8502
+
+Endpoints (all accept `window` = days, default 90, and `borough`, default All):
+    /api/health     data version
+    /api/stations   compute_station_metrics for the window
+    /api/summary    compute_overall_summary for the window
+    /api/compare    current vs prior period (overall + per station)
+    /api/themes     top themes in all / positive / negative reviews (`n`, default 6)
+
+In Arrow form, /api/compare returns one table with a `scope` column: a single
+"overall" row with the period-level values, followed by one "station" row each.
+
+Reviews are enriched once per data version, and every response is cached
+(LRU) by (data version, endpoint, validated params, format) with a strong
+ETag, so repeat callers sending If-None-Match get a 304 without any
+recomputation.
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pyarrow as pa
+import streamlit.logger
+
+from utils import (
+    load_data,
+    data_version,
+    enrich_reviews,
+    make_reviews_window,
+    filter_by_borough,
+    compute_station_metrics,
+    compute_overall_summary,
+    compute_station_comparison,
+    top_themes_from,
+)
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json"
+
+DEFAULT_WINDOW_DAYS = 90
+MAX_WINDOW_DAYS = 3650
+DEFAULT_TOP_THEMES = 6
+MAX_CACHE_ENTRIES = 512
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# ----------------------------
+# Data + response cache (keyed by data version)
+# ----------------------------
+# _lock guards _state and _responses and is only held for lookups and swaps.
+# _reload_lock serialises reloads: the version is read under it, so a slow
+# request can never swap an older dataset back in.
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_state = {"version": None, "stations": None, "reviews": None}
+_responses: OrderedDict[tuple, tuple[str, str, bytes]] = OrderedDict()
+
+
+def _snapshot(version: str):
+    with _lock:
+        if _state["version"] == version:
+            return version, _state["stations"], _state["reviews"]
+    return None
+
+
+def _current_data():
+    """
+    Returns (version, stations, reviews_enriched), reloading and
+    re-enriching only when the CSVs changed since the last load.
+    """
+    current = _snapshot(data_version())
+    if current is not None:
+        return current
+
+    with _reload_lock:
+        version = data_version()
+        current = _snapshot(version)
+        if current is not None:
+            return current
+
+        load_data.clear()
+        stations, reviews = load_data()
+        reviews = enrich_reviews(reviews)
+
+        with _lock:
+            _state.update(version=version, stations=stations, reviews=reviews)
+            _responses.clear()
+        return version, stations, reviews
+
+
+def _cache_get(key: tuple):
+    with _lock:
+        hit = _responses.get(key)
+        if hit is not None:
+            _responses.move_to_end(key)
+        return hit
+
+
+def _cache_put(key: tuple, value: tuple):
+    with _lock:
+        # Drop results computed against data that was replaced meanwhile.
+        if key[0] != _state["version"]:
+            return
+        _responses[key] = value
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_CACHE_ENTRIES:
+            _responses.popitem(last=False)
+
+
+# ----------------------------
+# Params
+# ----------------------------
+def _int_param(params: dict, name: str, default: int, lo: int, hi: int) -> int:
+    raw = params.get(name, [None])[0]
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer")
+    if not lo <= value <= hi:
+        raise BadRequest(f"'{name}' must be between {lo} and {hi}")
+    return value
+
+
+def _borough_param(params: dict, stations: pd.DataFrame) -> str:
+    borough = params.get("borough", ["All"])[0] or "All"
+    if borough != "All" and borough not in set(stations["borough"].dropna()):
+        raise BadRequest(f"unknown borough '{borough}'")
+    return borough
+
+
+def parse_args(path: str, params: dict, stations: pd.DataFrame) -> dict:
+    """
+    Validated arguments for an endpoint. Only these go into the cache key,
+    so ignored params (cache-busters, `n` on /api/stations) share an entry.
+    """
+    args = {
+        "window": _int_param(params, "window", DEFAULT_WINDOW_DAYS, 1, MAX_WINDOW_DAYS),
+        "borough": _borough_param(params, stations),
+    }
+    if path == "/api/themes":
+        args["n"] = _int_param(params, "n", DEFAULT_TOP_THEMES, 1, 50)
+    return args
+
+
+# ----------------------------
+# Endpoint payloads: each returns (json_payload, arrow_frame)
+# ----------------------------
+def _records(df: pd.DataFrame) -> list[dict]:
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _window_meta(window_days: int, borough: str, cutoff, max_date) -> dict:
+    return {
+        "window_days": window_days,
+        "borough": borough,
+        "cutoff": cutoff.date().isoformat() if pd.notnull(cutoff) else None,
+        "max_date": max_date.date().isoformat() if pd.notnull(max_date) else None,
+    }
+
+
+def _scoped(stations, reviews, args):
+    window_days, borough = args["window"], args["borough"]
+    reviews_window, reviews_prior, cutoff, max_date = make_reviews_window(reviews, window_days)
+    stations_b, reviews_window = filter_by_borough(stations, reviews_window, borough)
+    _, reviews_prior = filter_by_borough(stations, reviews_prior, borough)
+    meta = _window_meta(window_days, borough, cutoff, max_date)
+    return stations_b, reviews_window, reviews_prior, meta
+
+
+def stations_endpoint(stations, reviews, args):
+    stations_b, reviews_window, _, meta = _scoped(stations, reviews, args)
+    metrics = compute_station_metrics(stations_b, reviews_window)
+    return {**meta, "stations": _records(metrics)}, metrics
+
+
+def summary_endpoint(stations, reviews, args):
+    stations_b, reviews_window, _, meta = _scoped(stations, reviews, args)
+    summary = compute_overall_summary(reviews_window)
+    summary["stations"] = int(stations_b.shape[0])
+    return {**meta, "summary": summary}, pd.DataFrame([summary])
+
+
+def compare_endpoint(stations, reviews, args):
+    stations_b, reviews_window, reviews_prior, meta = _scoped(stations, reviews, args)
+    cur = compute_overall_summary(reviews_window)
+    prev = compute_overall_summary(reviews_prior)
+
+    # Same convention as the Home page: no prior reviews means no change.
+    delta_rating = cur["avg_rating"] - prev["avg_rating"] if prev["reviews"] > 0 else 0.0
+    delta_neg = (cur["neg_pct"] - prev["neg_pct"]) if prev["reviews"] > 0 else 0.0
+
+    compare = compute_station_comparison(
+        compute_station_metrics(stations_b, reviews_window),
+        compute_station_metrics(stations_b, reviews_prior),
+    ).sort_values("delta_rating", ascending=False)
+
+    payload = {
+        **meta,
+        "current": cur,
+        "prior": prev,
+        "delta_rating": delta_rating,
+        "delta_neg_pct": delta_neg,
+        "stations": _records(compare),
+    }
+
+    # Arrow gets one table: the overall comparison as a leading "overall" row.
+    overall = pd.DataFrame([{
+        "station_id": None,
+        "name": "Overall",
+        "avg_rating_cur": cur["avg_rating"],
+        "neg_pct_cur": cur["neg_pct"],
+        "review_count_cur": cur["reviews"],
+        "avg_rating_prev": prev["avg_rating"],
+        "neg_pct_prev": prev["neg_pct"],
+        "review_count_prev": prev["reviews"],
+        "delta_rating": delta_rating,
+        "delta_neg_pct": delta_neg,
+    }])
+    frame = pd.concat(
+        [overall.assign(scope="overall"), compare.assign(scope="station")],
+        ignore_index=True,
+    )
+    frame = frame[["scope"] + [c for c in frame.columns if c != "scope"]]
+    return payload, frame
+
+
+def themes_endpoint(stations, reviews, args):
+    n = args["n"]
+    _, reviews_window, _, meta = _scoped(stations, reviews, args)
+
+    groups = {
+        "all": reviews_window,
+        "positive": reviews_window[reviews_window["sentiment_label"] == "positive"],
+        "negative": reviews_window[reviews_window["sentiment_label"] == "negative"],
+    }
+    ranked = {k: top_themes_from(df, n=n) for k, df in groups.items()}
+
+    rows = [
+        {"sentiment": k, "rank": i + 1, "theme": theme, "count": cnt}
+        for k, top in ranked.items()
+        for i, (theme, cnt) in enumerate(top)
+    ]
+    payload = {
+        **meta,
+        "themes": {k: [{"theme": t, "count": c} for t, c in top] for k, top in ranked.items()},
+    }
+    frame = pd.DataFrame(rows, columns=["sentiment", "rank", "theme", "count"])
+    return payload, frame
+
+
+ENDPOINTS = {
+    "/api/stations": stations_endpoint,
+    "/api/summary": summary_endpoint,
+    "/api/compare": compare_endpoint,
+    "/api/themes": themes_endpoint,
+}
+
+
+# ----------------------------
+# Serialisation
+# ----------------------------
+def to_arrow(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _nan_to_none(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _nan_to_none(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_nan_to_none(v) for v in value]
+    return value
+
+
+def to_json(payload: dict) -> bytes:
+    # NaN is not valid JSON; emit null like _records() does.
+    return json.dumps(_nan_to_none(payload), default=str, allow_nan=False).encode("utf-8")
+
+
+def wants_arrow(params: dict, accept: str) -> bool:
+    fmt = params.get("format", [""])[0].lower()
+    if fmt:
+        if fmt not in ("json", "arrow"):
+            raise BadRequest("'format' must be 'json' or 'arrow'")
+        return fmt == "arrow"
+    return ARROW_MIME in (accept or "")
+
+
+def render(path: str, params: dict, accept: str):
+    """
+    Returns (version, etag, content_type, body) for a request, serving from
+    the response cache when the data version and params are unchanged.
+    """
+    arrow = wants_arrow(params, accept)
+    version, stations, reviews = _current_data()
+    args = parse_args(path, params, stations)
+    key = (version, path, tuple(sorted(args.items())), arrow)
+
+    hit = _cache_get(key)
+    if hit is not None:
+        return (version, *hit)
+
+    payload, frame = ENDPOINTS[path](stations, reviews, args)
+    if arrow:
+        body, content_type = to_arrow(frame), ARROW_MIME
+    else:
+        body, content_type = to_json({"data_version": version, **payload}), JSON_MIME
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    _cache_put(key, (etag, content_type, body))
+    return version, etag, content_type, body
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+    server_version = "ShellReviewsAPI/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, keep-alive
+    # clients stall ~40ms per response on delayed ACKs.
+    disable_nagle_algorithm = True
+    quiet = False
+
+    def do_HEAD(self):
+        # Same status and headers as GET; _send skips the body.
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/api/health":
+            try:
+                version = data_version()
+            except Exception:
+                self._server_error()
+                return
+            self._send(200, JSON_MIME, to_json({"status": "ok", "data_version": version}))
+            return
+        if url.path not in ENDPOINTS:
+            self._send(404, JSON_MIME, to_json({"error": f"unknown endpoint '{url.path}'"}))
+            return
+
+        try:
+            version, etag, content_type, body = render(url.path, params, self.headers.get("Accept"))
+        except BadRequest as e:
+            self._send(400, JSON_MIME, to_json({"error": str(e)}))
+            return
+        except Exception:
+            self._server_error()
+            return
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept",
+            "X-Data-Version": version,
+        }
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self._send(304, None, b"", headers)
+        else:
+            self._send(200, content_type, body, headers)
+
+    def _send(self, status: int, content_type, body: bytes, headers: dict | None = None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        # A 304 must not advertise a length other than the 200's, so send none.
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _server_error(self):
+        # Always logged, even with --quiet.
+        super().log_message("error handling %r", self.path)
+        traceback.print_exc()
+        self._send(500, JSON_MIME, to_json({"error": "internal server error"}))
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve station metrics as JSON/Arrow.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--quiet", action="store_true", help="disable per-request access log")
+    args = parser.parse_args()
+
+    # utils' st.cache_* helpers work without a Streamlit session but warn on every call.
+    streamlit.logger.set_log_level("error")
+    MetricsHandler.quiet = args.quiet
+    server = ThreadingHTTPServer((args.host, args.port), MetricsHandler)
+    print(f"Serving metrics API on http://{args.host}:{args.port}/api/ (data version {data_version()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
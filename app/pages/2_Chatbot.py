@@ -7,6 +7,7 @@ from utils import (
     enrich_reviews,
     make_reviews_window,
     compute_station_metrics,
+    compute_station_comparison,
 )
 
 st.set_page_config(page_title="Chatbot", layout="wide")
@@ -73,20 +74,7 @@ def most_improved_stations(window_df: pd.DataFrame, prior_df: pd.DataFrame, top_
     cur = compute_station_metrics(stations, window_df)
     prev = compute_station_metrics(stations, prior_df)
 
-    comp = cur[["station_id", "name", "avg_rating", "neg_pct", "review_count"]].merge(
-        prev[["station_id", "avg_rating", "neg_pct", "review_count"]],
-        on="station_id",
-        how="left",
-        suffixes=("_cur", "_prev"),
-    )
-
-    comp["avg_rating_prev"] = comp["avg_rating_prev"].fillna(0.0)
-    comp["neg_pct_prev"] = comp["neg_pct_prev"].fillna(0.0)
-
-    comp["delta_rating"] = comp["avg_rating_cur"] - comp["avg_rating_prev"]
-    comp["delta_neg_pct"] = comp["neg_pct_cur"] - comp["neg_pct_prev"]
-
-    comp = comp[comp["review_count_cur"] > 0].copy()
+    comp = compute_station_comparison(cur, prev)
     comp = comp.sort_values(["delta_rating", "review_count_cur"], ascending=[False, False]).head(top_n)
     return comp
 
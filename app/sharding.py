@@ -0,0 +1,298 @@
+"""
+Sharded aggregation with mergeable partial aggregates.
+
+compute_station_metrics / compute_overall_summary need every review in one
+frame. For a larger estate the reviews are split into shards (by a station
+column such as region/borough, or by station-id hash), each shard is enriched
+and aggregated in its own process, and the partial aggregates are merged.
+
+A partial aggregate is a dict of three long frames, all keyed by station so
+any grouping (national, per region, per station) can be rebuilt by summing:
+    "stations": station_id, rows, review_count, rating_sum, rating_n,
+                pos_count, neu_count, neg_count
+    "themes":   station_id, sentiment_label, theme, count
+    "ratings":  station_id, rating, count   (rating histogram, used as an
+                exact mergeable sketch for quantiles of 1-5 star ratings)
+
+Counts and sums merge exactly, so station metrics, summaries, theme counts
+and rating quantiles match the single-frame path. Theme rankings match by
+count; ties are ordered by THEME_KEYWORDS because first appearance (what
+Counter.most_common uses) is not recoverable after merging.
+
+Reviews for stations missing from the station list, or whose station has no
+region, are counted nationally and in an "Unknown" region view.
+"""
+import os
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils import THEME_KEYWORDS, enrich_reviews, compute_station_metrics, finalize_station_metrics
+
+COUNT_COLS = ["rows", "review_count", "rating_sum", "rating_n", "pos_count", "neu_count", "neg_count"]
+PARTIAL_KEYS = {
+    "stations": ["station_id"],
+    "themes": ["station_id", "sentiment_label", "theme"],
+    "ratings": ["station_id", "rating"],
+}
+PARTIAL_VALUES = {"stations": COUNT_COLS, "themes": ["count"], "ratings": ["count"]}
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+UNKNOWN_REGION = "Unknown"
+# Below this many reviews, process start-up and pickling cost more than the
+# enrichment they parallelise, so the default is to run in-process.
+PARALLEL_MIN_REVIEWS = 20_000
+
+
+# ----------------------------
+# Shard assignment
+# ----------------------------
+def station_hash_shard(station_id: str, n_shards: int) -> int:
+    # crc32 rather than hash(): stable across processes and runs
+    return zlib.crc32(str(station_id).encode("utf-8")) % n_shards
+
+def station_labels(stations: pd.DataFrame, col: str) -> pd.Series:
+    """
+    station_id -> stations[col], one label per id. If the list repeats a
+    station_id the first row wins (compute_station_metrics tolerates
+    duplicates, so this path does too); missing labels become UNKNOWN_REGION.
+    """
+    first = stations.drop_duplicates("station_id")
+    return first.set_index("station_id")[col].fillna(UNKNOWN_REGION)
+
+def region_labels(station_ids: pd.Series, labels: pd.Series) -> pd.Series:
+    return station_ids.map(labels).fillna(UNKNOWN_REGION)
+
+def assign_shards(stations: pd.DataFrame, reviews: pd.DataFrame, by: str = "borough", n_shards: int = 8) -> pd.Series:
+    """
+    Returns the shard label for each review (aligned to reviews.index).
+    `by` is a station column (e.g. "region", "borough") or "hash".
+    Reviews for stations missing from the list go to an UNKNOWN_REGION shard,
+    so national totals still match compute_overall_summary.
+    """
+    if by == "hash":
+        return reviews["station_id"].map(lambda s: station_hash_shard(s, n_shards))
+    return region_labels(reviews["station_id"], station_labels(stations, by))
+
+
+# ----------------------------
+# Partial aggregates
+# ----------------------------
+def partial_aggregate(reviews: pd.DataFrame) -> dict:
+    """
+    Aggregates one shard of reviews. Enriches first if sentiment/themes
+    are not already present (that is the expensive, parallelisable part).
+    """
+    if "sentiment_label" not in reviews.columns or "themes" not in reviews.columns:
+        reviews = enrich_reviews(reviews)
+
+    label = reviews["sentiment_label"]
+    tmp = pd.DataFrame({
+        "station_id": reviews["station_id"],
+        "rows": 1,
+        "review_count": reviews["review_id"].notna().astype(int),
+        "rating_sum": reviews["rating"].fillna(0.0),
+        "rating_n": reviews["rating"].notna().astype(int),
+        "pos_count": (label == "positive").astype(int),
+        "neu_count": (label == "neutral").astype(int),
+        "neg_count": (label == "negative").astype(int),
+    })
+    counts = tmp.groupby("station_id", sort=False).sum().reset_index()
+
+    exploded = reviews[["station_id", "sentiment_label", "themes"]].explode("themes").dropna(subset=["themes"])
+    themes = (
+        exploded.rename(columns={"themes": "theme"})
+        .groupby(["station_id", "sentiment_label", "theme"])
+        .size()
+        .reset_index(name="count")
+    )
+
+    ratings = (
+        reviews.dropna(subset=["rating"])
+        .groupby(["station_id", "rating"])
+        .size()
+        .reset_index(name="count")
+    )
+
+    return {"stations": counts, "themes": themes, "ratings": ratings}
+
+def merge_partials(partials) -> dict:
+    """
+    Sums any number of partial aggregates into one. Merging is associative,
+    so shards can be combined in any order or in stages.
+    """
+    partials = list(partials)
+    merged = {}
+    for name, by in PARTIAL_KEYS.items():
+        frames = [p[name] for p in partials if not p[name].empty]
+        if not frames:
+            merged[name] = pd.DataFrame(columns=by + PARTIAL_VALUES[name])
+            continue
+        merged[name] = pd.concat(frames, ignore_index=True).groupby(by, as_index=False).sum()
+    return merged
+
+
+# ----------------------------
+# Views from a (merged) partial
+# ----------------------------
+def station_metrics_from(stations: pd.DataFrame, partial: dict) -> pd.DataFrame:
+    """Same output as compute_station_metrics(stations, reviews)."""
+    counts = partial["stations"]
+    if counts.empty:
+        return compute_station_metrics(stations, pd.DataFrame())
+
+    agg = counts.assign(avg_rating=counts["rating_sum"] / counts["rating_n"].where(counts["rating_n"] > 0))
+    return finalize_station_metrics(
+        stations, agg[["station_id", "review_count", "avg_rating", "pos_count", "neu_count", "neg_count"]]
+    )
+
+def _summary_from_totals(totals: pd.Series) -> dict:
+    total = int(totals["rows"])
+    if total == 0:
+        return {"reviews": 0, "avg_rating": 0.0, "neg_pct": 0.0, "pos": 0, "neu": 0, "neg": 0}
+
+    rating_n = int(totals["rating_n"])
+    avg_rating = float(totals["rating_sum"]) / rating_n if rating_n > 0 else float("nan")
+    neg = int(totals["neg_count"])
+
+    return {
+        "reviews": total,
+        "avg_rating": avg_rating,
+        "neg_pct": neg / total,
+        "pos": int(totals["pos_count"]),
+        "neu": int(totals["neu_count"]),
+        "neg": neg,
+    }
+
+def summary_from(partial: dict) -> dict:
+    """Same output as compute_overall_summary(reviews)."""
+    return _summary_from_totals(partial["stations"][COUNT_COLS].sum())
+
+def _rank_themes(counts: dict, n: int) -> list[tuple[str, int]]:
+    order = {t: i for i, t in enumerate(THEME_KEYWORDS)}
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], order.get(kv[0], len(order)), kv[0]))
+    return [(theme, int(cnt)) for theme, cnt in ranked[:n]]
+
+def top_themes_from_partial(partial: dict, sentiment: str | None = None, n: int = 6):
+    """
+    Counts match top_themes_from(); ties are ordered by THEME_KEYWORDS
+    rather than by first appearance in the frame.
+    """
+    themes = partial["themes"]
+    if sentiment is not None:
+        themes = themes[themes["sentiment_label"] == sentiment]
+    return _rank_themes(themes.groupby("theme")["count"].sum().to_dict(), n)
+
+def _quantiles_from_hist(hist: pd.Series, qs) -> dict:
+    # hist: count per rating value, sorted by rating
+    n = int(hist.sum())
+    if n == 0:
+        return {q: float("nan") for q in qs}
+
+    values = hist.index.to_numpy(dtype=float)
+    cum = hist.cumsum().to_numpy()
+
+    def value_at(k: int) -> float:
+        # k-th smallest rating (0-based)
+        return float(values[(cum > k).argmax()])
+
+    out = {}
+    for q in qs:
+        pos = q * (n - 1)
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        v_lo, v_hi = value_at(lo), value_at(hi)
+        out[q] = v_lo + (v_hi - v_lo) * (pos - lo)
+    return out
+
+def rating_quantiles(partial: dict, qs=DEFAULT_QUANTILES) -> dict:
+    """
+    Quantiles from the merged rating histogram, using the same linear
+    interpolation as pandas Series.quantile().
+    """
+    return _quantiles_from_hist(partial["ratings"].groupby("rating")["count"].sum().sort_index(), qs)
+
+def build_view(stations: pd.DataFrame, partial: dict, top_n: int = 6) -> dict:
+    return {
+        "summary": summary_from(partial),
+        "stations": station_metrics_from(stations, partial),
+        "top_positive_themes": top_themes_from_partial(partial, "positive", top_n),
+        "top_negative_themes": top_themes_from_partial(partial, "negative", top_n),
+        "rating_quantiles": rating_quantiles(partial),
+    }
+
+# ----------------------------
+# Driver
+# ----------------------------
+def aggregate_sharded(
+    stations: pd.DataFrame,
+    reviews: pd.DataFrame,
+    by: str = "borough",
+    n_shards: int = 8,
+    max_workers: int | None = None,
+) -> dict:
+    """
+    Splits reviews into shards and aggregates each one in a process pool.
+    Returns {shard_label: partial}. max_workers=1 runs in-process, as does
+    the default (None) when there is one CPU or fewer than
+    PARALLEL_MIN_REVIEWS reviews.
+    """
+    labels = assign_shards(stations, reviews, by=by, n_shards=n_shards)
+    shards = {label: df for label, df in reviews.groupby(labels, sort=True)}
+    if not shards:
+        return {}
+
+    workers = max_workers or os.cpu_count() or 1
+    small = max_workers is None and len(reviews) < PARALLEL_MIN_REVIEWS
+    if workers == 1 or len(shards) == 1 or small:
+        return {label: partial_aggregate(df) for label, df in shards.items()}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(partial_aggregate, shards.values())
+        return dict(zip(shards.keys(), results))
+
+def build_views(stations: pd.DataFrame, partials: dict, region_col: str = "borough", top_n: int = 6) -> dict:
+    """
+    Merges shard partials into the national view plus one view per value of
+    `region_col`. Regions are rebuilt from station-level partials, so they do
+    not depend on how the data was sharded. Reviews for unlisted stations (or
+    stations without a region) form an UNKNOWN_REGION view, so the regional
+    review counts always add up to the national one.
+    """
+    merged = merge_partials(partials.values())
+    national = build_view(stations, merged, top_n)
+
+    # One groupby per partial frame, keyed by region; the per-region loop
+    # below only reads these small results.
+    labels = station_labels(stations, region_col)
+    counts, themes, ratings = merged["stations"], merged["themes"], merged["ratings"]
+    totals = counts.groupby(region_labels(counts["station_id"], labels))[COUNT_COLS].sum()
+    theme_counts = themes.groupby(
+        [region_labels(themes["station_id"], labels), themes["sentiment_label"], themes["theme"]]
+    )["count"].sum()
+    hists = ratings.groupby([region_labels(ratings["station_id"], labels), ratings["rating"]])["count"].sum()
+
+    by_region_sentiment = defaultdict(dict)
+    for (region, sentiment, theme), cnt in theme_counts.items():
+        by_region_sentiment[(region, sentiment)][theme] = cnt
+    hist_by_region = {region: h.droplevel(0).sort_index() for region, h in hists.groupby(level=0)}
+
+    # Station metrics are per-row, so regional tables are slices of the national one.
+    metrics = national["stations"]
+    metrics_by_region = dict(list(metrics.groupby(metrics[region_col].fillna(UNKNOWN_REGION))))
+
+    zero = pd.Series(0, index=COUNT_COLS)
+    no_ratings = pd.Series(dtype=float)
+    regions = {}
+    for region in dict.fromkeys([*stations[region_col].fillna(UNKNOWN_REGION), *totals.index]):
+        regions[region] = {
+            "summary": _summary_from_totals(totals.loc[region] if region in totals.index else zero),
+            "stations": metrics_by_region.get(region, metrics.iloc[0:0]).reset_index(drop=True),
+            "top_positive_themes": _rank_themes(by_region_sentiment[(region, "positive")], top_n),
+            "top_negative_themes": _rank_themes(by_region_sentiment[(region, "negative")], top_n),
+            "rating_quantiles": _quantiles_from_hist(
+                hist_by_region.get(region, no_ratings), DEFAULT_QUANTILES
+            ),
+        }
+    return {"national": national, "regions": regions}
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import streamlit as st
 from collections import Counter
@@ -23,6 +24,9 @@ THEME_KEYWORDS = {
     "car_wash": ["car wash", "jet wash", "wash", "vacuum"],
 }
 
+STATIONS_CSV = "data/stations.csv"
+REVIEWS_CSV = "data/reviews.csv"
+
 @st.cache_resource
 def get_vader():
     # Ensure VADER lexicon exists in the deployment environment (Streamlit Cloud)
@@ -62,8 +66,8 @@ def vader_sentiment_label(text: str) -> tuple[str, float]:
 
 @st.cache_data
 def load_data():
-    stations = pd.read_csv("data/stations.csv")
-    reviews = pd.read_csv("data/reviews.csv", parse_dates=["review_date"])
+    stations = pd.read_csv(STATIONS_CSV)
+    reviews = pd.read_csv(REVIEWS_CSV, parse_dates=["review_date"])
 
     stations["station_id"] = stations["station_id"].astype(str).str.strip()
     reviews["station_id"] = reviews["station_id"].astype(str).str.strip()
@@ -71,6 +75,17 @@ def load_data():
 
     return stations, reviews
 
+def data_version() -> str:
+    """
+    Cheap fingerprint of the source CSVs (size + mtime).
+    Changes whenever either file is rewritten, so it can key caches and ETags.
+    """
+    parts = []
+    for path in (STATIONS_CSV, REVIEWS_CSV):
+        info = os.stat(path)
+        parts.append(f"{info.st_size:x}-{info.st_mtime_ns:x}")
+    return ".".join(parts)
+
 def enrich_reviews(reviews_df: pd.DataFrame) -> pd.DataFrame:
     out = reviews_df.copy()
     out["themes"] = out["review_text"].apply(tag_themes)
@@ -126,6 +141,14 @@ def compute_station_metrics(stations: pd.DataFrame, reviews: pd.DataFrame) -> pd
         .reset_index()
     )
 
+    return finalize_station_metrics(stations, agg)
+
+def finalize_station_metrics(stations: pd.DataFrame, agg: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins per-station aggregates (station_id, review_count, avg_rating,
+    pos_count, neu_count, neg_count) onto the station list and adds the
+    derived/display columns. Shared by the single-frame and sharded paths.
+    """
     out = stations.merge(agg, on="station_id", how="left")
     out["review_count"] = out["review_count"].fillna(0).astype(int)
     out["avg_rating"] = out["avg_rating"].fillna(0.0)
@@ -134,10 +157,7 @@ def compute_station_metrics(stations: pd.DataFrame, reviews: pd.DataFrame) -> pd
     out["neu_count"] = out["neu_count"].fillna(0).astype(int)
     out["neg_count"] = out["neg_count"].fillna(0).astype(int)
 
-    out["neg_pct"] = out.apply(
-        lambda r: (r["neg_count"] / r["review_count"]) if r["review_count"] > 0 else 0.0,
-        axis=1
-    )
+    out["neg_pct"] = (out["neg_count"] / out["review_count"]).where(out["review_count"] > 0, 0.0)
 
     out["avg_rating_display"] = out["avg_rating"].apply(lambda x: f"{x:.2f}" if x > 0 else "N/A")
     out["review_count_display"] = out["review_count"].astype(str)
@@ -145,6 +165,36 @@ def compute_station_metrics(stations: pd.DataFrame, reviews: pd.DataFrame) -> pd
 
     return out
 
+def compute_station_comparison(stations_cur: pd.DataFrame, stations_prev: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-station deltas between two compute_station_metrics() frames.
+    Only stations with reviews in the current period are kept.
+    """
+    compare = stations_cur[["station_id", "name", "avg_rating", "neg_pct", "review_count"]].merge(
+        stations_prev[["station_id", "avg_rating", "neg_pct", "review_count"]],
+        on="station_id",
+        how="left",
+        suffixes=("_cur", "_prev"),
+    )
+
+    compare["avg_rating_prev"] = compare["avg_rating_prev"].fillna(0.0)
+    compare["neg_pct_prev"] = compare["neg_pct_prev"].fillna(0.0)
+
+    compare["delta_rating"] = compare["avg_rating_cur"] - compare["avg_rating_prev"]
+    compare["delta_neg_pct"] = compare["neg_pct_cur"] - compare["neg_pct_prev"]
+
+    return compare[compare["review_count_cur"] > 0].copy()
+
+def filter_by_borough(stations: pd.DataFrame, reviews: pd.DataFrame, borough: str | None):
+    """
+    Restrict stations and their reviews to one borough ("All"/None keeps everything).
+    """
+    if not borough or borough == "All":
+        return stations, reviews
+    stations_b = stations[stations["borough"] == borough].copy()
+    reviews_b = reviews[reviews["station_id"].isin(stations_b["station_id"])].copy()
+    return stations_b, reviews_b
+
 def top_themes_from(df: pd.DataFrame, n: int = 6):
     all_t = []
     for themes in df["themes"].tolist():
@@ -0,0 +1,170 @@
+"""
+Benchmark and parity check for sharded aggregation (app/sharding.py).
+
+Builds a larger synthetic estate by copying the London stations/reviews into
+several regions (plus a review for an unlisted station and a duplicated
+station row), then compares the single-frame path
+(enrich_reviews + compute_station_metrics + compute_overall_summary) with the
+sharded path at increasing worker counts. From the repo root:
+
+    python scripts/bench_sharded.py --regions 8 --copies 200 --workers 1,2,4,8
+
+Additive metrics (review/sentiment/theme counts, rating sums and the averages
+derived from them) and the rating quantiles must match the single-frame path
+exactly; the script exits non-zero if they do not. Theme rankings are compared
+by count, since ties may be ordered differently.
+
+Each run reports the time spent in shard aggregation (parallel) and in the
+merge/views step (serial in the parent), so the achievable speedup on a
+multi-core host can be read off directly.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import streamlit.logger  # noqa: E402
+
+from utils import (  # noqa: E402
+    load_data,
+    enrich_reviews,
+    compute_station_metrics,
+    compute_overall_summary,
+    top_themes_from,
+    THEME_KEYWORDS,
+)
+from sharding import DEFAULT_QUANTILES, aggregate_sharded, build_views  # noqa: E402
+
+TOP_N = 6
+ADDITIVE_COLS = ["station_id", "review_count", "avg_rating", "pos_count", "neu_count", "neg_count", "neg_pct"]
+
+
+def synthetic_estate(stations: pd.DataFrame, reviews: pd.DataFrame, regions: int, copies: int):
+    """
+    `regions` x `copies` clones of the sample data. Each clone gets its own
+    station ids; stations are tagged with a region column for sharding.
+    """
+    all_stations, all_reviews = [], []
+    for r in range(regions):
+        for c in range(copies):
+            suffix = f"_r{r}c{c}"
+            s = stations.assign(station_id=stations["station_id"] + suffix, region=f"region_{r}")
+            v = reviews.assign(
+                station_id=reviews["station_id"] + suffix,
+                review_id=reviews["review_id"] + suffix,
+            )
+            all_stations.append(s)
+            all_reviews.append(v)
+    stations = pd.concat(all_stations, ignore_index=True)
+    reviews = pd.concat(all_reviews, ignore_index=True)
+
+    # Edge cases the sharded path must handle like the single-frame one.
+    unlisted = reviews.iloc[[0]].assign(station_id="st_unlisted", review_id="r_unlisted")
+    duplicate = stations.iloc[[0]]
+    return (
+        pd.concat([stations, duplicate], ignore_index=True),
+        pd.concat([reviews, unlisted], ignore_index=True),
+    )
+
+
+def single_frame(stations, reviews):
+    enriched = enrich_reviews(reviews)
+    metrics = compute_station_metrics(stations, enriched)
+    summary = compute_overall_summary(enriched)
+    # every theme, so ties at the top-N cutoff can be checked by count
+    themes = {
+        s: dict(top_themes_from(enriched[enriched["sentiment_label"] == s], n=len(THEME_KEYWORDS)))
+        for s in ("positive", "negative")
+    }
+    quantiles = {q: float(enriched["rating"].quantile(q)) for q in DEFAULT_QUANTILES}
+    return metrics, summary, themes, quantiles
+
+
+def same_values(a: dict, b: dict) -> bool:
+    """Dict equality that treats NaN == NaN (avg_rating/quantiles with no ratings)."""
+    def same(x, y):
+        if isinstance(x, float) and isinstance(y, float) and math.isnan(x) and math.isnan(y):
+            return True
+        return x == y
+    return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+
+
+def check_parity(single, views) -> list[str]:
+    metrics, summary, themes, quantiles = single
+    national = views["national"]
+    problems = []
+
+    a = metrics[ADDITIVE_COLS].sort_values("station_id").reset_index(drop=True)
+    b = national["stations"][ADDITIVE_COLS].sort_values("station_id").reset_index(drop=True)
+    if not a.equals(b):
+        problems.append("station metrics differ")
+    if not same_values(summary, national["summary"]):
+        problems.append(f"summary differs: {summary} vs {national['summary']}")
+    for s, key in (("positive", "top_positive_themes"), ("negative", "top_negative_themes")):
+        # Each returned count must be right, and the counts must be the top ones.
+        expected_top = sorted(themes[s].values(), reverse=True)[:TOP_N]
+        returned = national[key]
+        if any(themes[s].get(t) != c for t, c in returned) or [c for _, c in returned] != expected_top:
+            problems.append(f"{s} theme counts differ: {dict(returned)} vs {themes[s]}")
+    if not same_values(quantiles, national["rating_quantiles"]):
+        problems.append(f"rating quantiles differ: {quantiles} vs {national['rating_quantiles']}")
+
+    region_reviews = sum(v["summary"]["reviews"] for v in views["regions"].values())
+    if region_reviews != summary["reviews"]:
+        problems.append("regional review counts do not add up to national")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharded vs single-frame aggregation.")
+    parser.add_argument("--regions", type=int, default=8)
+    parser.add_argument("--copies", type=int, default=200, help="copies of the sample data per region")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts to try")
+    parser.add_argument("--by", default="region", help="station column to shard by, or 'hash'")
+    parser.add_argument("--shards", type=int, default=16, help="number of shards when --by hash")
+    args = parser.parse_args()
+
+    streamlit.logger.set_log_level("error")
+    stations, reviews = load_data()
+    stations, reviews = synthetic_estate(stations, reviews, args.regions, args.copies)
+    print(f"estate: {len(stations)} stations, {len(reviews)} reviews, sharded by {args.by}")
+
+    t0 = time.perf_counter()
+    single = single_frame(stations, reviews)
+    base = time.perf_counter() - t0
+    print(f"single frame:          {base:7.2f}s")
+
+    failed = False
+    serial_1 = parallel_1 = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        t0 = time.perf_counter()
+        partials = aggregate_sharded(stations, reviews, by=args.by, n_shards=args.shards, max_workers=workers)
+        t1 = time.perf_counter()
+        views = build_views(stations, partials, region_col="region", top_n=TOP_N)
+        t2 = time.perf_counter()
+        elapsed = t2 - t0
+        if workers == 1:
+            parallel_1, serial_1 = t1 - t0, t2 - t1
+
+        problems = check_parity(single, views)
+        failed = failed or bool(problems)
+        status = "match" if not problems else "MISMATCH: " + "; ".join(problems)
+        print(
+            f"sharded, {workers:2d} worker(s): {elapsed:7.2f}s"
+            f"  (shards {t1 - t0:.2f}s + merge/views {t2 - t1:.2f}s)  speedup {base / elapsed:5.2f}x  {status}"
+        )
+
+    if parallel_1 is not None:
+        print(f"cpus: {os.cpu_count()}; from the 1-worker split, ideal time at N workers = "
+              f"{serial_1:.2f}s + {parallel_1:.2f}s / N, plus process start-up")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
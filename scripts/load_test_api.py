@@ -0,0 +1,131 @@
+"""
+Load test for the headless metrics API (app/api.py).
+
+Start the API first (`python app/api.py --quiet`), then from the repo root:
+
+    python scripts/load_test_api.py --duration 20 --concurrency 16
+
+Each worker keeps one HTTP/1.1 connection open and cycles through the
+endpoints for a few window/borough combinations. With --revalidate (default)
+workers send If-None-Match with the last ETag they saw, the way a polling
+dashboard would, so most responses are 304s. Use --no-revalidate to measure
+full 200 responses instead.
+"""
+import argparse
+import http.client
+import itertools
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+ENDPOINTS = ["/api/stations", "/api/summary", "/api/compare", "/api/themes"]
+WINDOWS = [30, 90, 365]
+
+
+def build_paths(boroughs: list[str], fmt: str) -> list[str]:
+    paths = []
+    for endpoint, window, borough in itertools.product(ENDPOINTS, WINDOWS, boroughs):
+        query = {"window": window, "borough": borough}
+        if fmt != "json":
+            query["format"] = fmt
+        paths.append(f"{endpoint}?{urlencode(query)}")
+    return paths
+
+
+def worker(host, port, paths, offset, deadline, revalidate, results, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags = {}
+    latencies = []
+    statuses = Counter()
+    for i in itertools.count(offset):
+        if time.perf_counter() >= deadline:
+            break
+        path = paths[i % len(paths)]
+        headers = {}
+        if revalidate and path in etags:
+            headers["If-None-Match"] = etags[path]
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            statuses["error"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - t0)
+        statuses[resp.status] += 1
+        if resp.getheader("ETag"):
+            etags[path] = resp.getheader("ETag")
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["statuses"].update(statuses)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sustained requests/second against the metrics API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel client connections")
+    parser.add_argument("--boroughs", default="All", help="comma-separated boroughs to rotate through")
+    parser.add_argument("--format", choices=["json", "arrow"], default="json")
+    parser.add_argument("--revalidate", action=argparse.BooleanOptionalAction, default=True,
+                        help="send If-None-Match with the last seen ETag")
+    args = parser.parse_args()
+
+    paths = build_paths([b.strip() for b in args.boroughs.split(",") if b.strip()], args.format)
+
+    # Warm the server-side cache so the run measures steady state.
+    conn = http.client.HTTPConnection(args.host, args.port, timeout=60)
+    for path in paths:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise SystemExit(f"warm-up failed: {path} -> {resp.status}")
+    conn.close()
+
+    results = {"latencies": [], "statuses": Counter()}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(args.host, args.port, paths, n, deadline, args.revalidate, results, lock),
+        )
+        for n in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = results["latencies"]
+    total = sum(results["statuses"].values())
+    print(f"requests:     {total} in {elapsed:.1f}s ({args.concurrency} connections, {len(paths)} distinct URLs)")
+    print(f"throughput:   {total / elapsed:.0f} req/s")
+    if lat:
+        print(
+            f"latency ms:   mean {statistics.mean(lat) * 1000:.1f}  p50 {percentile(lat, 50) * 1000:.1f}  "
+            f"p95 {percentile(lat, 95) * 1000:.1f}  p99 {percentile(lat, 99) * 1000:.1f}"
+        )
+    print("statuses:     " + ", ".join(f"{k}: {v}" for k, v in sorted(results["statuses"].items(), key=str)))
+
+
+if __name__ == "__main__":
+    main()